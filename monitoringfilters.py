@@ -1,11 +1,46 @@
 # monitoring/filters.py
 
 import django_filters
+from django_filters.constants import EMPTY_VALUES
 from .models import ServerMetric, AssetInfo, WindowsUpdate # Import relevant models
 
-class ServerMetricFilter(django_filters.FilterSet):
-    # exact match for hostname
-    hostname = django_filters.CharFilter(field_name='hostname', lookup_expr='iexact')
+class BaseFilterSet(django_filters.FilterSet):
+    """
+    FilterSet that skips building and validating its form when the request has
+    no query parameters, which is the common case for unfiltered list views.
+    """
+    def is_valid(self):
+        if not self.data:
+            return True # Nothing to validate
+        return super().is_valid()
+
+    @property
+    def qs(self):
+        if not self.data:
+            return self.queryset.all()
+        return super().qs
+
+class SmartCharFilter(django_filters.CharFilter):
+    """
+    CharFilter that uses its (indexable) lookup_expr for plain values and switches to a
+    pattern search when the value starts or ends with a '*' or '%' wildcard: a trailing
+    one only (?hostname=web*) is a case-insensitive prefix search, which a b-tree
+    pattern index can serve; a leading one (?kb_id=*5005) is a contains search. A literal
+    '%' has to be sent URL-encoded, as %25.
+    """
+    WILDCARDS = '*%'
+
+    def filter(self, qs, value):
+        if value not in EMPTY_VALUES and (value[0] in self.WILDCARDS or value[-1] in self.WILDCARDS):
+            lookup = 'icontains' if value[0] in self.WILDCARDS else 'istartswith'
+            qs = self.get_method(qs)(**{f'{self.field_name}__{lookup}': value.strip(self.WILDCARDS)})
+            return qs.distinct() if self.distinct else qs
+        return super().filter(qs, value)
+
+class ServerMetricFilter(BaseFilterSet):
+    # case-insensitive exact match for hostname (served by the UPPER(hostname) index);
+    # 'web*' is a prefix search on the same index, '*web*' uses the trigram index
+    hostname = SmartCharFilter(field_name='hostname', lookup_expr='iexact')
     # greater than or equal to timestamp
     timestamp_gte = django_filters.DateTimeFilter(field_name='timestamp', lookup_expr='gte')
     # less than or equal to timestamp
@@ -13,15 +48,9 @@ class ServerMetricFilter(django_filters.FilterSet):
 
     class Meta:
         model = ServerMetric
-        # You can also just list fields directly without custom filter instances
-        fields = ['hostname', 'timestamp'] # These will provide exact matches by default
-        # If you define specific filters above, list them here if you want to include them in the meta fields
-        # fields = {
-        #     'hostname': ['exact', 'iexact'], # Example for multiple lookups
-        #     'timestamp': ['exact', 'gte', 'lte'],
-        # }
-
-class AssetInfoFilter(django_filters.FilterSet):
+        fields = [] # Only the filters declared above; listing fields here would generate extra exact-match filters
+
+class AssetInfoFilter(BaseFilterSet):
     # Filter by OS name
     os_pretty_name = django_filters.CharFilter(field_name='os__pretty_name', lookup_expr='icontains')
     # Filter by System manufacturer
@@ -33,18 +62,12 @@ class AssetInfoFilter(django_filters.FilterSet):
 
     class Meta:
         model = AssetInfo
-        # You can specify exact fields for filtering or use custom filters defined above
-        fields = [
-            'os__pretty_name',
-            'system__manufacturer',
-            'memory__total_mb',
-            'virtualization__is_vm'
-        ]
-
-class WindowsUpdateFilter(django_filters.FilterSet):
-    # Filter by KB ID (case-insensitive contains)
-    kb_id = django_filters.CharFilter(field_name='kb_id', lookup_expr='icontains')
-    # Filter by title (case-insensitive contains)
+        fields = [] # Only the filters declared above
+
+class WindowsUpdateFilter(BaseFilterSet):
+    # Filter by KB ID (exact, indexed); 'KB500*' is an indexed prefix search, '*5005' a contains search (full scan)
+    kb_id = SmartCharFilter(field_name='kb_id', lookup_expr='exact')
+    # Filter by title (case-insensitive contains, served by a trigram index)
     title = django_filters.CharFilter(field_name='title', lookup_expr='icontains')
     # Filter by installed on date (greater than or equal to)
     installed_on_gte = django_filters.DateTimeFilter(field_name='installed_on', lookup_expr='gte')
@@ -53,9 +76,4 @@ class WindowsUpdateFilter(django_filters.FilterSet):
 
     class Meta:
         model = WindowsUpdate
-        fields = [
-            'kb_id',
-            'title',
-            'installed_on',
-            'status'
-      
\ No newline at end of file
+        fields = ['status'] # Exact match; everything else is declared above
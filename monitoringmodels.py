@@ -1,6 +1,285 @@
 # monitoring/models.py
 
-from django.db import models
+import math
+from collections import defaultdict
+
+# OpClass indexes only render correctly with 'django.contrib.postgres' in INSTALLED_APPS
+from django.contrib.postgres.indexes import BrinIndex, GinIndex, OpClass
+from django.db import connection, models
+from django.db.models import F, OuterRef, Subquery
+from django.db.models.expressions import RawSQL
+from django.db.models.fields.json import KT
+from django.db.models.functions import Upper
+from django.utils import timezone
+from rest_framework import fields as drf_fields
+
+SIZE_UNITS = {'': 1, 'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3, 'T': 1024 ** 4, 'P': 1024 ** 5}
+
+def parse_size(value):
+    """
+    Convert a human-readable size as reported by df/du/lsblk (e.g. '103G', '1.5T', '512M')
+    to a number of bytes. Returns None if the value can't be parsed or doesn't fit the
+    BigIntegerField columns it is stored in.
+    """
+    value = value.strip().upper().removesuffix('IB').removesuffix('B') # Also accept '2GB'/'2GiB'/'512B'
+    unit = value[-1:] if value[-1:].isalpha() else ''
+    try:
+        number = float(value[:len(value) - len(unit)])
+    except ValueError:
+        return None
+    if unit not in SIZE_UNITS:
+        return None
+    size = number * SIZE_UNITS[unit]
+    if not math.isfinite(size) or not 0 <= size < 2 ** 63: # e.g. '1e400', 'nan', '-5G'
+        return None
+    return int(size)
+
+
+def hidden_columns(model, fk):
+    """Columns the nested serializers leave out for model: its keys and any denormalized copies."""
+    return ('id', fk, *getattr(model, 'denormalized_fields', ()))
+
+
+def value_columns(model, fk):
+    """Columns the nested serializers emit for model."""
+    hidden = hidden_columns(model, fk)
+    return [field.attname for field in model._meta.concrete_fields if field.attname not in hidden]
+
+
+def value_representations(model):
+    """
+    {column: to_representation} for the columns of model the serializers don't output as
+    the Python value: DecimalFields become strings and DateTimeFields are localized to
+    the current time zone, by the same DRF fields ModelSerializer maps them to.
+    """
+    representations = {}
+    for field in model._meta.concrete_fields:
+        if isinstance(field, models.DecimalField):
+            representations[field.attname] = drf_fields.DecimalField(
+                field.max_digits, field.decimal_places
+            ).to_representation
+        elif isinstance(field, models.DateTimeField):
+            representations[field.attname] = drf_fields.DateTimeField().to_representation
+    return representations
+
+
+def datetime_json_sql(column):
+    """
+    SQL rendering the timestamptz column as DRF's DateTimeField does: ISO 8601 in the
+    current time zone, microseconds only when there are any and 'Z' for a zero offset.
+    """
+    tz = timezone.get_current_timezone_name().replace("'", "''")
+    local = f"({column} AT TIME ZONE '{tz}')"
+    offset = f"({local} - ({column} AT TIME ZONE 'UTC'))"
+    return (
+        f"""to_char({local}, 'YYYY-MM-DD"T"HH24:MI:SS')"""
+        f" || CASE WHEN date_trunc('second', {column}) = {column} THEN '' ELSE to_char({local}, '.US') END"
+        f" || CASE WHEN {offset} = interval '0' THEN 'Z'"
+        f" WHEN {offset} > interval '0' THEN '+' || to_char({offset}, 'HH24:MI')"
+        f" ELSE '-' || to_char(-{offset}, 'HH24:MI') END"
+    )
+
+def _json_columns(model, fk):
+    # Row as JSON minus its keys, like the nested serializers' exclude = ['id', fk], with
+    # decimals (as text, i.e. with all their places) and datetimes formatted like DRF does
+    json = ' - '.join(["to_jsonb(t)", *(f"'{column}'" for column in hidden_columns(model, fk))])
+    formatted = []
+    for field in model._meta.concrete_fields:
+        if field.attname in hidden_columns(model, fk):
+            continue
+        if isinstance(field, models.DecimalField):
+            formatted.append(f"'{field.attname}', t.{field.column}::text")
+        elif isinstance(field, models.DateTimeField):
+            formatted.append(f"'{field.attname}', {datetime_json_sql(f't.{field.column}')}")
+    if formatted:
+        json = f"({json}) || jsonb_build_object({', '.join(formatted)})"
+    return json
+
+def _json_row(model, fk, parent, extra=''):
+    """SQL for the JSON object of the model row whose fk points at parent (a table alias)."""
+    table = model._meta.db_table
+    return (
+        f"(SELECT {_json_columns(model, fk)} FROM {table} t "
+        f"WHERE t.{fk} = {parent}.id{extra})"
+    )
+
+def _json_rows(model, fk, parent, extra=''):
+    """SQL for the JSON array of the model rows whose fk points at parent, in id order."""
+    table = model._meta.db_table
+    return (
+        f"(SELECT coalesce(jsonb_agg({_json_columns(model, fk)} ORDER BY t.id), '[]'::jsonb) "
+        f"FROM {table} t WHERE t.{fk} = {parent}.id{extra})"
+    )
+
+def asset_info_json_sql(asset_info, hostname):
+    """
+    SQL for the AssetInfoSerializer document of the AssetInfo row aliased asset_info;
+    hostname is the SQL expression for its server's hostname.
+    """
+    return f"""jsonb_build_object(
+        'hostname', {hostname},
+        'os', {_json_row(OSInfo, 'asset_info_id', asset_info)},
+        'system', {_json_row(SystemInfo, 'asset_info_id', asset_info)},
+        'cpu', {_json_row(CPUInfo, 'asset_info_id', asset_info)},
+        'memory', {_json_row(MemoryInfo, 'asset_info_id', asset_info)},
+        'virtualization', {_json_row(VirtualizationInfo, 'asset_info_id', asset_info)},
+        'disks', {_json_rows(DiskInfo, 'asset_info_id', asset_info)},
+        'network_interfaces', {_json_rows(NetworkInterfaceInfo, 'asset_info_id', asset_info)},
+        'windows_updates', {_json_rows(WindowsUpdate, 'asset_info_id', asset_info)}
+    )"""
+
+
+class ServerMetricQuerySet(models.QuerySet):
+    def nested_values(self):
+        """
+        Same documents as ServerMetricSerializer produces (decimals and datetimes are
+        formatted by the DRF fields it uses), built from .values() dicts instead of model
+        instances: one query for the metrics and their one-to-one children, plus one
+        query per list relation. Works on any database backend.
+        """
+        asset_one_to_one = {
+            'os': OSInfo, 'system': SystemInfo, 'cpu': CPUInfo,
+            'memory': MemoryInfo, 'virtualization': VirtualizationInfo,
+        }
+        metrics_one_to_one = {
+            'memory_usage': MemoryUsageMetric, 'cpu_load': CPULoadMetric, 'network_usage': NetworkUsageMetric,
+        }
+        lookups = ['id', 'timestamp', 'hostname', 'asset_info__id', 'metrics_data__id', 'metrics_data__top_processes__id']
+        for name, model in asset_one_to_one.items():
+            lookups += [f'asset_info__{name}__{column}' for column in value_columns(model, 'asset_info_id')]
+        for name, model in metrics_one_to_one.items():
+            lookups += [f'metrics_data__{name}__{column}' for column in value_columns(model, 'metrics_data_id')]
+        rows = list(self.values(*lookups))
+
+        def represented(model, values):
+            # Serializer output for the values() of model's columns, None staying None
+            for column, to_representation in value_representations(model).items():
+                if values.get(column) is not None:
+                    values[column] = to_representation(values[column])
+            return values
+
+        def grouped(model, fk, ids, *extra_key):
+            groups = defaultdict(list)
+            queryset = model.objects.filter(**{f'{fk}__in': ids}).order_by('id')
+            for row in queryset.values(fk, *value_columns(model, fk)):
+                groups[(row.pop(fk), *(row[key] for key in extra_key))].append(represented(model, row))
+            return groups
+
+        asset_ids = [row['asset_info__id'] for row in rows]
+        metrics_ids = [row['metrics_data__id'] for row in rows]
+        disks = grouped(DiskInfo, 'asset_info_id', asset_ids)
+        network_interfaces = grouped(NetworkInterfaceInfo, 'asset_info_id', asset_ids)
+        windows_updates = grouped(WindowsUpdate, 'asset_info_id', asset_ids)
+        disk_usage = grouped(DiskUsageMetric, 'metrics_data_id', metrics_ids)
+        top_disk_consumers = grouped(TopDiskConsumerMetric, 'metrics_data_id', metrics_ids)
+        processes = grouped(
+            ProcessDetail, 'top_processes_metric_id',
+            [row['metrics_data__top_processes__id'] for row in rows], 'process_type',
+        )
+
+        timestamp = value_representations(ServerMetric)['timestamp']
+        documents = []
+        for row in rows:
+            asset_info_id, metrics_data_id = row['asset_info__id'], row['metrics_data__id']
+            top_processes_id = row['metrics_data__top_processes__id']
+            asset_info = {
+                name: represented(model, {
+                    column: row[f'asset_info__{name}__{column}'] for column in value_columns(model, 'asset_info_id')
+                })
+                for name, model in asset_one_to_one.items()
+            }
+            asset_info.update(
+                disks=disks[(asset_info_id,)],
+                network_interfaces=network_interfaces[(asset_info_id,)],
+                windows_updates=windows_updates[(asset_info_id,)],
+                hostname=row['hostname'],
+            )
+            metrics = {
+                name: represented(model, {
+                    column: row[f'metrics_data__{name}__{column}'] for column in value_columns(model, 'metrics_data_id')
+                })
+                for name, model in metrics_one_to_one.items()
+            }
+            metrics.update(
+                top_processes={
+                    'cpu_processes': processes[(top_processes_id, 'cpu')],
+                    'memory_processes': processes[(top_processes_id, 'memory')],
+                },
+                disk_usage=disk_usage[(metrics_data_id,)],
+                top_disk_consumers=top_disk_consumers[(metrics_data_id,)],
+            )
+            documents.append({
+                'id': row['id'],
+                'asset_info': asset_info,
+                'metrics': metrics,
+                'timestamp': timestamp(row['timestamp']),
+                'hostname': row['hostname'],
+            })
+        return documents
+
+    def summary_values(self):
+        """
+        One flat dict per metric with its headline numbers (memory use, CPU load, network
+        throughput and the fullest filesystem), read in a single query. For dashboards
+        plotting time series, which don't need the nested documents.
+        """
+        fullest_disk = DiskUsageMetric.objects.filter(
+            metrics_data__server_metric=OuterRef('pk')
+        ).order_by('-percentage_used').values('percentage_used')[:1]
+        return self.values(
+            'id', 'timestamp', 'hostname',
+            memory_percent=F('metrics_data__memory_usage__percentage_used'),
+            load_1min=F('metrics_data__cpu_load__load_1min'),
+            load_5min=F('metrics_data__cpu_load__load_5min'),
+            load_15min=F('metrics_data__cpu_load__load_15min'),
+            received_bps=F('metrics_data__network_usage__received_bps'),
+            transmitted_bps=F('metrics_data__network_usage__transmitted_bps'),
+            disk_percent_max=Subquery(fullest_disk),
+        )
+
+    def with_nested_json(self):
+        """
+        Annotate each ServerMetric with `nested_json`, the full nested document
+        (same shape as ServerMetricSerializer output) assembled by Postgres with
+        jsonb_build_object/jsonb_agg, so reading it takes a single query. Values match
+        the serializer's too, except that float columns holding whole numbers come out
+        as e.g. 40 rather than 40.0.
+        """
+        return self.annotate(nested_json=RawSQL(self._nested_json_sql(), [], output_field=models.JSONField()))
+
+    @staticmethod
+    def _nested_json_sql():
+        server_metric = ServerMetric._meta.db_table
+        asset_info = f"""(
+            SELECT {asset_info_json_sql('ai', f'{server_metric}.hostname')}
+            FROM {AssetInfo._meta.db_table} ai WHERE ai.server_metric_id = {server_metric}.id
+        )"""
+        top_processes = f"""(
+            SELECT jsonb_build_object(
+                'cpu_processes', {_json_rows(ProcessDetail, 'top_processes_metric_id', 'tp', " AND t.process_type = 'cpu'")},
+                'memory_processes', {_json_rows(ProcessDetail, 'top_processes_metric_id', 'tp', " AND t.process_type = 'memory'")}
+            )
+            FROM {TopProcessesMetric._meta.db_table} tp WHERE tp.metrics_data_id = md.id
+        )"""
+        metrics = f"""(
+            SELECT jsonb_build_object(
+                'memory_usage', {_json_row(MemoryUsageMetric, 'metrics_data_id', 'md')},
+                'cpu_load', {_json_row(CPULoadMetric, 'metrics_data_id', 'md')},
+                'network_usage', {_json_row(NetworkUsageMetric, 'metrics_data_id', 'md')},
+                'top_processes', {top_processes},
+                'disk_usage', {_json_rows(DiskUsageMetric, 'metrics_data_id', 'md')},
+                'top_disk_consumers', {_json_rows(TopDiskConsumerMetric, 'metrics_data_id', 'md')}
+            )
+            FROM {MetricData._meta.db_table} md WHERE md.server_metric_id = {server_metric}.id
+        )"""
+        return f"""jsonb_build_object(
+            'id', {server_metric}.id,
+            'asset_info', {asset_info},
+            'metrics', {metrics},
+            'timestamp', {datetime_json_sql(f'{server_metric}.timestamp')},
+            'hostname', {server_metric}.hostname
+        )"""
+
 
 class ServerMetric(models.Model):
     """
@@ -10,6 +289,8 @@ class ServerMetric(models.Model):
     timestamp = models.DateTimeField(help_text="Timestamp of the metric collection (UTC).")
     hostname = models.CharField(max_length=255, help_text="Hostname of the server.")
 
+    objects = ServerMetricQuerySet.as_manager()
+
     def __str__(self):
         return f"{self.hostname} - {self.timestamp.strftime('%Y-%m-%d %H:%M:%S')}"
 
@@ -17,6 +298,100 @@ class ServerMetric(models.Model):
         verbose_name = "Server Metric"
         verbose_name_plural = "Server Metrics"
         ordering = ['-timestamp'] # Order by most recent first
+        indexes = [
+            models.Index(fields=['-timestamp']), # Default ordering (cursor pages) and short ranges
+            # Metrics are inserted in roughly timestamp order, so a BRIN index (a few pages for
+            # millions of rows) narrows wide time-range scans such as exports and summaries
+            BrinIndex(fields=['timestamp'], pages_per_range=32, name='sm_timestamp_brin'),
+            # hostname filter uses iexact, i.e. UPPER(hostname) = UPPER(%s), and istartswith
+            # for 'web*' searches, i.e. UPPER(hostname) LIKE 'WEB%'
+            models.Index(OpClass(Upper('hostname'), name='text_pattern_ops'), name='sm_hostname_upper_idx'),
+            # Trigram index for '*web*' contains searches, needs pg_trgm
+            GinIndex(OpClass(Upper('hostname'), name='gin_trgm_ops'), name='sm_hostname_trgm'),
+        ]
+        constraints = [
+            # A host reports one metric per timestamp, so a re-sent metric is skipped on ingest
+            # (existing duplicates are removed by dedupe_server_metrics() before it is added).
+            # Its index also serves "metrics for host X in a time range" (read backwards for
+            # newest first) and hostname-only lookups.
+            models.UniqueConstraint(fields=['hostname', 'timestamp'], name='sm_hostname_timestamp_uniq'),
+        ]
+
+
+class LatestServerMetric(models.Model):
+    """
+    Most recent ServerMetric per hostname, backed by the latest_server_metric
+    Postgres materialized view (see LATEST_SERVER_METRIC_SQL).
+    Refreshed after every ingest so dashboards don't have to group the full table.
+    """
+    server_metric = models.OneToOneField(
+        ServerMetric,
+        on_delete=models.DO_NOTHING,
+        primary_key=True,
+        db_column='id',
+        related_name='+',
+        help_text="The most recent server metric entry for this hostname."
+    )
+    timestamp = models.DateTimeField(help_text="Timestamp of the metric collection (UTC).")
+    hostname = models.CharField(max_length=255, help_text="Hostname of the server.")
+
+    def __str__(self):
+        return f"Latest for {self.hostname} - {self.timestamp.strftime('%Y-%m-%d %H:%M:%S')}"
+
+    @classmethod
+    def refresh(cls):
+        # CONCURRENTLY keeps the view readable during the refresh (needs the unique index below)
+        with connection.cursor() as cursor:
+            cursor.execute(f'REFRESH MATERIALIZED VIEW CONCURRENTLY {cls._meta.db_table}')
+
+    class Meta:
+        managed = False # Created by LATEST_SERVER_METRIC_SQL in a RunSQL migration
+        db_table = 'latest_server_metric'
+        verbose_name = "Latest Server Metric"
+        verbose_name_plural = "Latest Server Metrics"
+
+
+class PendingServerMetric(models.Model):
+    """
+    A ServerMetric payload accepted by the API but not stored yet. POSTs only insert the
+    raw JSON here; ingest_pending_metrics() (monitoring/tasks.py) creates the nested
+    rows in batches.
+    """
+    payload = models.JSONField(help_text="The request body as received.")
+    received_at = models.DateTimeField(auto_now_add=True, help_text="When the payload was accepted (UTC).")
+
+    def __str__(self):
+        return f"Pending metric {self.pk} received {self.received_at.strftime('%Y-%m-%d %H:%M:%S')}"
+
+    class Meta:
+        verbose_name = "Pending Server Metric"
+        verbose_name_plural = "Pending Server Metrics"
+
+
+# Forward/reverse SQL for migrations.RunSQL
+LATEST_SERVER_METRIC_SQL = (
+    """
+    CREATE MATERIALIZED VIEW latest_server_metric AS
+        SELECT DISTINCT ON (hostname) id, timestamp, hostname
+        FROM monitoring_servermetric
+        ORDER BY hostname, timestamp DESC;
+    CREATE UNIQUE INDEX latest_server_metric_hostname_idx ON latest_server_metric (hostname);
+    """,
+    "DROP MATERIALIZED VIEW IF EXISTS latest_server_metric;",
+)
+
+
+def dedupe_server_metrics(apps, schema_editor):
+    """
+    RunPython migration step to run before adding sm_hostname_timestamp_uniq: deletes
+    metrics repeating the hostname and timestamp of an earlier one (re-sent samples),
+    keeping the first stored, together with their nested rows.
+    """
+    ServerMetric = apps.get_model('monitoring', 'ServerMetric')
+    first = ServerMetric.objects.filter(
+        hostname=OuterRef('hostname'), timestamp=OuterRef('timestamp')
+    ).order_by('id').values('id')[:1]
+    ServerMetric.objects.annotate(first_id=Subquery(first)).exclude(id=F('first_id')).delete()
 
 
 class AssetInfo(models.Model):
@@ -30,14 +405,40 @@ class AssetInfo(models.Model):
         related_name='asset_info',
         help_text="The server metric entry this asset information belongs to."
     )
-    hostname = models.CharField(max_length=255, help_text="Hostname from asset info (redundant but kept for structure).")
+    # Assets never change once ingested, so the list endpoint serves this instead of
+    # joining and serializing the nested rows on every read
+    document = models.JSONField(
+        null=True, blank=True, editable=False,
+        help_text="The asset as AssetInfoSerializer outputs it, built by Postgres on ingest."
+    )
+    created_at = models.DateTimeField(
+        auto_now_add=True, help_text="When the asset was stored, by the server's clock (UTC)."
+    )
 
     def __str__(self):
         return f"Asset Info for {self.server_metric.hostname}"
 
+    @classmethod
+    def document_sql(cls):
+        """SQL expression computing `document` for the row being updated, see store_documents()."""
+        table = cls._meta.db_table
+        hostname = f"(SELECT hostname FROM {ServerMetric._meta.db_table} WHERE id = {table}.server_metric_id)"
+        return RawSQL(asset_info_json_sql(table, hostname), [], output_field=models.JSONField())
+
+    @classmethod
+    def store_documents(cls, queryset):
+        """(Re)build `document` for the assets in queryset, once their nested rows exist."""
+        return queryset.update(document=cls.document_sql())
+
     class Meta:
         verbose_name = "Asset Information"
         verbose_name_plural = "Asset Information"
+        indexes = [
+            # The list is sorted by hostname; reading it from the document avoids a join to sort
+            models.Index(KT('document__hostname'), name='asset_document_hostname_idx'),
+            # Last-Modified of the asset endpoints is MAX(created_at)
+            models.Index(fields=['-created_at']),
+        ]
 
 
 class OSInfo(models.Model):
@@ -57,6 +458,10 @@ class OSInfo(models.Model):
     class Meta:
         verbose_name = "OS Information"
         verbose_name_plural = "OS Information"
+        indexes = [
+            # Trigram index for the icontains filter (UPPER(pretty_name) LIKE UPPER('%...%')), needs pg_trgm
+            GinIndex(OpClass(Upper('pretty_name'), name='gin_trgm_ops'), name='os_pretty_name_trgm'),
+        ]
 
 
 class SystemInfo(models.Model):
@@ -80,6 +485,10 @@ class SystemInfo(models.Model):
     class Meta:
         verbose_name = "System Information"
         verbose_name_plural = "System Information"
+        indexes = [
+            # Trigram index for the icontains filter (UPPER(manufacturer) LIKE UPPER('%...%')), needs pg_trgm
+            GinIndex(OpClass(Upper('manufacturer'), name='gin_trgm_ops'), name='system_manufacturer_trgm'),
+        ]
 
 
 class CPUInfo(models.Model):
@@ -122,6 +531,7 @@ class MemoryInfo(models.Model):
     class Meta:
         verbose_name = "Memory Information"
         verbose_name_plural = "Memory Information"
+        indexes = [models.Index(fields=['total_mb'])]
 
 
 class DiskInfo(models.Model):
@@ -134,6 +544,7 @@ class DiskInfo(models.Model):
     )
     name = models.CharField(max_length=50, help_text="Disk device name (e.g., 'sda').")
     size = models.CharField(max_length=50, help_text="Disk size (e.g., '256G').")
+    size_bytes = models.BigIntegerField(null=True, blank=True, help_text="Disk size in bytes, parsed from size.")
     model = models.CharField(max_length=255, blank=True, help_text="Disk model.")
     serial = models.CharField(max_length=255, blank=True, help_text="Disk serial number.")
 
@@ -185,6 +596,122 @@ class VirtualizationInfo(models.Model):
     class Meta:
         verbose_name = "Virtualization Information"
         verbose_name_plural = "Virtualization Information"
+        indexes = [models.Index(fields=['is_vm'])]
+
+
+class WindowsUpdate(models.Model):
+    """An installed Windows update (hotfix). Not reported by Linux systems."""
+    asset_info = models.ForeignKey(
+        AssetInfo,
+        on_delete=models.CASCADE,
+        related_name='windows_updates',
+        db_index=False, # Covered by the (asset_info, -installed_on) index
+        help_text="The asset information entry this Windows update belongs to."
+    )
+    kb_id = models.CharField(max_length=50, help_text="Knowledge Base ID of the update (e.g., 'KB5005565').")
+    title = models.CharField(max_length=512, blank=True, help_text="Title of the update.")
+    installed_on = models.DateTimeField(null=True, blank=True, help_text="When the update was installed (UTC).")
+    status = models.CharField(max_length=50, blank=True, help_text="Installation status (e.g., 'Succeeded').")
+    # Copy of asset_info.server_metric.hostname, set on ingest, so listings sort without joins
+    hostname = models.CharField(max_length=255, blank=True, help_text="Hostname of the server the update was installed on.")
+
+    denormalized_fields = ('hostname',) # Left out of the nested API documents
+
+    def __str__(self):
+        return f"{self.kb_id} ({self.status})"
+
+    class Meta:
+        verbose_name = "Windows Update"
+        verbose_name_plural = "Windows Updates"
+        indexes = [
+            models.Index(fields=['kb_id']),
+            # 'KB500*' searches, i.e. UPPER(kb_id) LIKE 'KB500%'; '*5005' ones scan
+            models.Index(OpClass(Upper('kb_id'), name='text_pattern_ops'), name='wu_kb_id_upper_idx'),
+            models.Index(fields=['-installed_on', 'hostname']), # Default ordering of the list endpoint
+            models.Index(fields=['asset_info', '-installed_on']), # An asset's updates, newest first
+            models.Index(fields=['status']),
+            # Trigram index for the title icontains filter, needs pg_trgm
+            GinIndex(OpClass(Upper('title'), name='gin_trgm_ops'), name='wu_title_trgm'),
+        ]
+
+
+def backfill_asset_info_document(apps, schema_editor):
+    """
+    RunPython migration step building AssetInfo.document for assets stored before
+    the column existed; new assets get it on ingest. The SQL is written out for the
+    tables as they were when the column was added, rather than derived from the
+    current models, so later schema changes don't alter what this step writes.
+    """
+    def row(table, json="to_jsonb(t) - 'id' - 'asset_info_id'"):
+        return f"(SELECT {json} FROM {table} t WHERE t.asset_info_id = a.id)"
+
+    def rows(table, json="to_jsonb(t) - 'id' - 'asset_info_id'"):
+        return (
+            f"(SELECT coalesce(jsonb_agg({json} ORDER BY t.id), '[]'::jsonb) "
+            f"FROM {table} t WHERE t.asset_info_id = a.id)"
+        )
+
+    windows_update = (
+        "(to_jsonb(t) - 'id' - 'asset_info_id') "
+        f"|| jsonb_build_object('installed_on', {datetime_json_sql('t.installed_on')})"
+    )
+    schema_editor.execute(f"""
+        UPDATE monitoring_assetinfo a SET document = jsonb_build_object(
+            'hostname', (SELECT s.hostname FROM monitoring_servermetric s WHERE s.id = a.server_metric_id),
+            'os', {row('monitoring_osinfo')},
+            'system', {row('monitoring_systeminfo')},
+            'cpu', {row('monitoring_cpuinfo')},
+            'memory', {row('monitoring_memoryinfo')},
+            'virtualization', {row('monitoring_virtualizationinfo')},
+            'disks', {rows('monitoring_diskinfo')},
+            'network_interfaces', {rows('monitoring_networkinterfaceinfo')},
+            'windows_updates', {rows('monitoring_windowsupdate', windows_update)}
+        )
+        WHERE a.document IS NULL
+    """)
+
+
+def backfill_windows_update_hostname(apps, schema_editor):
+    """
+    RunPython migration step copying the server hostname onto Windows updates stored
+    before WindowsUpdate.hostname existed; new rows get it on ingest.
+    """
+    WindowsUpdate = apps.get_model('monitoring', 'WindowsUpdate')
+    AssetInfo = apps.get_model('monitoring', 'AssetInfo')
+    hostname = AssetInfo.objects.filter(pk=OuterRef('asset_info')).values('server_metric__hostname')[:1]
+    WindowsUpdate.objects.filter(hostname='').update(hostname=Subquery(hostname))
+
+
+def backfill_size_bytes(apps, schema_editor):
+    """
+    RunPython migration step parsing the *_bytes columns from the size strings of rows
+    stored before those columns existed; new rows get them on ingest.
+    """
+    size_fields = {
+        'DiskInfo': (('size', 'size_bytes'),),
+        'DiskUsageMetric': (
+            ('total_size', 'total_size_bytes'),
+            ('used_size', 'used_size_bytes'),
+            ('available_size', 'available_size_bytes'),
+        ),
+        'TopDiskConsumerMetric': (('size', 'size_bytes'),),
+    }
+    batch_size = 2000
+    for model_name, pairs in size_fields.items():
+        model = apps.get_model('monitoring', model_name)
+        bytes_fields = [bytes_field for _, bytes_field in pairs]
+        rows = model.objects.filter(**{f'{bytes_fields[0]}__isnull': True}).only(
+            *(size_field for size_field, _ in pairs)
+        )
+        batch = []
+        for row in rows.iterator(chunk_size=batch_size):
+            for size_field, bytes_field in pairs:
+                setattr(row, bytes_field, parse_size(getattr(row, size_field)))
+            batch.append(row)
+            if len(batch) == batch_size:
+                model.objects.bulk_update(batch, bytes_fields)
+                batch = []
+        model.objects.bulk_update(batch, bytes_fields)
 
 
 class MetricData(models.Model):
@@ -216,10 +743,13 @@ class DiskUsageMetric(models.Model):
         help_text="The metric data entry this disk usage belongs to."
     )
     filesystem = models.CharField(max_length=255, help_text="Filesystem path (e.g., '/dev/sda2').")
-    percentage_used = models.DecimalField(max_digits=5, decimal_places=2, help_text="Percentage of disk used.")
+    percentage_used = models.FloatField(help_text="Percentage of disk used.")
     total_size = models.CharField(max_length=50, help_text="Total size of the filesystem (e.g., '512M').")
     used_size = models.CharField(max_length=50, help_text="Used size of the filesystem.")
     available_size = models.CharField(max_length=50, help_text="Available size of the filesystem.")
+    total_size_bytes = models.BigIntegerField(null=True, blank=True, help_text="Total size in bytes, parsed from total_size.")
+    used_size_bytes = models.BigIntegerField(null=True, blank=True, help_text="Used size in bytes, parsed from used_size.")
+    available_size_bytes = models.BigIntegerField(null=True, blank=True, help_text="Available size in bytes, parsed from available_size.")
 
     def __str__(self):
         return f"{self.filesystem} - {self.percentage_used}%"
@@ -242,7 +772,7 @@ class MemoryUsageMetric(models.Model):
     used_mb = models.IntegerField(help_text="Used memory in MB.")
     free_mb = models.IntegerField(help_text="Free memory in MB.")
     available_mb = models.IntegerField(help_text="Available memory in MB.")
-    percentage_used = models.DecimalField(max_digits=5, decimal_places=2, help_text="Percentage of memory used.")
+    percentage_used = models.FloatField(help_text="Percentage of memory used.")
 
     def __str__(self):
         return f"{self.used_mb}MB used ({self.percentage_used}%)"
@@ -260,9 +790,9 @@ class CPULoadMetric(models.Model):
         related_name='cpu_load',
         help_text="The metric data entry this CPU load belongs to."
     )
-    load_1min = models.DecimalField(max_digits=5, decimal_places=2, help_text="CPU load average over 1 minute.")
-    load_5min = models.DecimalField(max_digits=5, decimal_places=2, help_text="CPU load average over 5 minutes.")
-    load_15min = models.DecimalField(max_digits=5, decimal_places=2, help_text="CPU load average over 15 minutes.")
+    load_1min = models.FloatField(help_text="CPU load average over 1 minute.")
+    load_5min = models.FloatField(help_text="CPU load average over 5 minutes.")
+    load_15min = models.FloatField(help_text="CPU load average over 15 minutes.")
 
     def __str__(self):
         return f"Load: {self.load_1min}, {self.load_5min}, {self.load_15min}"
@@ -323,8 +853,8 @@ class ProcessDetail(models.Model):
     process_type = models.CharField(max_length=10, choices=PROCESS_TYPE_CHOICES, help_text="Type of top process (CPU or Memory).")
     pid = models.IntegerField(help_text="Process ID.")
     user = models.CharField(max_length=255, help_text="User running the process.")
-    cpu_percent = models.DecimalField(max_digits=5, decimal_places=2, help_text="CPU usage percentage.")
-    mem_percent = models.DecimalField(max_digits=5, decimal_places=2, help_text="Memory usage percentage.")
+    cpu_percent = models.FloatField(help_text="CPU usage percentage.")
+    mem_percent = models.FloatField(help_text="Memory usage percentage.")
     command = models.TextField(help_text="Full command of the process.")
 
     def __str__(self):
@@ -346,6 +876,7 @@ class TopDiskConsumerMetric(models.Model):
         help_text="The metric data entry this top disk consumer belongs to."
     )
     size = models.CharField(max_length=50, help_text="Size of the directory/file (e.g., '103G').")
+    size_bytes = models.BigIntegerField(null=True, blank=True, help_text="Size in bytes, parsed from size.")
     path = models.CharField(max_length=1024, help_text="Path of the directory/file.")
 
     def __str__(self):
@@ -355,3 +886,4 @@ class TopDiskConsumerMetric(models.Model):
         verbose_name = "Top Disk Consumer Metric"
         verbose_name_plural = "Top Disk Consumer Metrics"
         unique_together = ('metrics_data', 'path')
+        indexes = [models.Index(fields=['-size_bytes'])] # "Top N consumers" across hosts
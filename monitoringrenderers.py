@@ -0,0 +1,32 @@
+# monitoring/renderers.py
+
+import json
+
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError: # Optional: without it everything is encoded by the stdlib json module
+    orjson = None
+
+def encode_json(data):
+    """
+    Encode data as compact JSON bytes, with orjson (a C extension) when it is installed.
+    Types orjson doesn't handle itself, such as Decimal, go through DRF's JSONEncoder,
+    datetimes are written the way DRF writes them (UTC as 'Z') and non-string keys
+    (e.g. the item indexes of list validation errors) are converted like json does.
+    """
+    if orjson is None:
+        return json.dumps(data, cls=JSONEncoder, ensure_ascii=False, separators=(',', ':')).encode()
+    return orjson.dumps(data, default=JSONEncoder().default, option=orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS)
+
+class ORJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer using encode_json(). Output is always compact, whatever indent the
+    client asks for.
+    """
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return encode_json(data)
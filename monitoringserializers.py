@@ -1,64 +1,241 @@
 # monitoring/serializers.py
 
+import copy
+from operator import attrgetter
+
+from django.db import transaction
+from django.db.models import Prefetch
+from django.utils.functional import cached_property
 from rest_framework import serializers
+from rest_framework.fields import SkipField
+from rest_framework.relations import PKOnlyObject
 from .models import (
-    ServerMetric, AssetInfo, OSInfo, SystemInfo, CPUInfo, MemoryInfo,
+    parse_size, ServerMetric, LatestServerMetric, AssetInfo, OSInfo, SystemInfo, CPUInfo, MemoryInfo,
     DiskInfo, NetworkInterfaceInfo, VirtualizationInfo, WindowsUpdate, # Added WindowsUpdate
     MetricData, DiskUsageMetric, MemoryUsageMetric, CPULoadMetric,
     NetworkUsageMetric, TopProcessesMetric, ProcessDetail, TopDiskConsumerMetric
 )
 
+# Rows per INSERT statement when bulk-creating nested lists
+BULK_CREATE_BATCH_SIZE = 500
+
+def unique_by(rows, *keys):
+    """
+    Drop rows repeating the unique key of another row in the same list, keeping the
+    last one, as an upsert would. Nested rows are always created under a new parent,
+    so duplicates within the payload are the only way to hit a unique_together.
+    """
+    return list({tuple(row[key] for key in keys): row for row in rows}.values())
+
+# Unbound fields built by ModelSerializer.get_fields(), keyed by serializer class
+_FIELDS_CACHE = {}
+
+class CachedModelSerializer(serializers.ModelSerializer):
+    """
+    ModelSerializer that introspects its model and builds its fields once per class
+    instead of on every instantiation; each instance gets a deep copy, as DRF already
+    does for declared fields. Readable/writable field lists are kept as tuples instead
+    of being re-filtered for every serialized row, and the attribute lookup for each
+    of them is resolved once per serializer instance (see _read_plan).
+    """
+    def get_fields(self):
+        cls = type(self)
+        if cls not in _FIELDS_CACHE:
+            _FIELDS_CACHE[cls] = super().get_fields()
+        return copy.deepcopy(_FIELDS_CACHE[cls])
+
+    @classmethod
+    def setup_eager_loading(cls, queryset):
+        """
+        Load the whole nested structure up front so reading a list of objects costs a
+        constant number of queries instead of one per related row.
+
+        Each serializer lists the relations it reads in Meta.select_related and
+        Meta.prefetch_related, relative to its own model; the lists of nested
+        serializers are prefixed with the path to them and merged in here.
+
+        Both the main query (including its JOINed tables) and the prefetched lists
+        load only the columns their serializers read, see get_projection.
+        """
+        select_related, prefetch_related = cls.get_eager_loading_lookups()
+        if select_related:
+            queryset = queryset.select_related(*select_related)
+        if prefetch_related:
+            queryset = queryset.prefetch_related(*prefetch_related)
+        return queryset.only(*cls.get_only_lookups())
+
+    @classmethod
+    def get_eager_loading_lookups(cls, prefix='', prefetched=False):
+        """
+        Return (select_related, prefetch_related) lookups for this serializer and the ones
+        nested in it, prefixed with `prefix`. Below a prefetched (many=True) relation,
+        select_related lookups have to be prefetched as well.
+        """
+        select_related, prefetch_related = [], []
+        for lookup in getattr(cls.Meta, 'select_related', ()):
+            (prefetch_related if prefetched else select_related).append(prefix + lookup)
+        for lookup in getattr(cls.Meta, 'prefetch_related', ()):
+            if isinstance(lookup, Prefetch):
+                lookup = Prefetch(prefix + lookup.prefetch_through, queryset=lookup.queryset, to_attr=lookup.to_attr)
+            else:
+                lookup = prefix + lookup
+            prefetch_related.append(lookup)
+
+        for name, field in cls._declared_fields.items():
+            many = isinstance(field, serializers.ListSerializer)
+            nested = field.child if many else field
+            if isinstance(nested, CachedModelSerializer):
+                path = f'{prefix}{field.source or name}'
+                if many and path in prefetch_related:
+                    rel = cls.Meta.model._meta.get_field(field.source or name)
+                    queryset = nested.Meta.model.objects.only(
+                        rel.field.name, *nested.get_projection()
+                    )
+                    prefetch_related[prefetch_related.index(path)] = Prefetch(path, queryset=queryset)
+                nested_select, nested_prefetch = nested.get_eager_loading_lookups(
+                    path + '__', prefetched or many
+                )
+                select_related += nested_select
+                prefetch_related += nested_prefetch
+        return select_related, prefetch_related
+
+    @classmethod
+    def get_projection(cls):
+        """
+        Names of the model columns this serializer reads (primary key included), for
+        use with .only(). Columns it doesn't output are left unfetched. A dotted source
+        such as 'server_metric.hostname' also yields 'server_metric__hostname', which
+        narrows the related table when it is JOINed and is ignored otherwise.
+        """
+        opts = cls.Meta.model._meta
+        columns = {field.name for field in opts.concrete_fields} - {opts.pk.name}
+        sources = {
+            field.source for field in cls().fields.values()
+            if not field.write_only and field.source != '*'
+        }
+        projection = {source.split('.')[0] for source in sources} & columns
+        projection |= {source.replace('.', '__') for source in sources if source.split('.')[0] in columns and '.' in source}
+        return [opts.pk.name, *sorted(projection)]
+
+    @classmethod
+    def get_only_lookups(cls, prefix=''):
+        """
+        .only() lookups for this serializer's columns and those of the nested serializers
+        it JOINs through Meta.select_related, prefixed with `prefix`.
+        """
+        lookups = [prefix + column for column in cls.get_projection()]
+        select_related = getattr(cls.Meta, 'select_related', ())
+        for name, field in cls._declared_fields.items():
+            if isinstance(field, CachedModelSerializer) and (field.source or name) in select_related:
+                lookups += field.get_only_lookups(f'{prefix}{field.source or name}__')
+        return lookups
+
+    @cached_property
+    def _readable_fields(self):
+        return tuple(field for field in self.fields.values() if not field.write_only)
+
+    @cached_property
+    def _writable_fields(self):
+        return tuple(field for field in self.fields.values() if not field.read_only)
+
+    @cached_property
+    def _read_plan(self):
+        """
+        (field name, getter, field) for every readable field, worked out once per
+        serializer instance, i.e. once per list of rows. Fields reading a plain model
+        column get an attrgetter instead of DRF's generic get_attribute(), which walks
+        source_attrs and checks for mappings, callables and missing relations per value.
+        """
+        opts = self.Meta.model._meta
+        columns = {field.name for field in opts.concrete_fields if not field.is_relation}
+        plan = []
+        for field in self._readable_fields:
+            if (type(field).get_attribute is serializers.Field.get_attribute
+                    and field.source in columns):
+                getter = attrgetter(field.source)
+            else:
+                getter = field.get_attribute
+            plan.append((field.field_name, getter, field))
+        return tuple(plan)
+
+    def to_representation(self, instance):
+        # Same output as Serializer.to_representation, using the precomputed getters
+        if not isinstance(instance, self.Meta.model): # e.g. validated_data
+            return super().to_representation(instance)
+        ret = {}
+        for field_name, getter, field in self._read_plan:
+            try:
+                attribute = getter(instance)
+            except SkipField:
+                continue
+            check_for_none = attribute.pk if isinstance(attribute, PKOnlyObject) else attribute
+            ret[field_name] = None if check_for_none is None else field.to_representation(attribute)
+        return ret
+
+class SizeBytesMixin:
+    """
+    Fills the integer *_bytes columns from the human-readable size strings on input.
+    size_fields lists (string field, bytes field) pairs.
+    """
+    size_fields = ()
+
+    def to_internal_value(self, data):
+        validated_data = super().to_internal_value(data)
+        for size_field, bytes_field in self.size_fields:
+            validated_data[bytes_field] = parse_size(validated_data[size_field])
+        return validated_data
+
 # --- Asset Information Serializers ---
 
-class OSInfoSerializer(serializers.ModelSerializer):
+class OSInfoSerializer(CachedModelSerializer):
     class Meta:
         model = OSInfo
         exclude = ['id', 'asset_info'] # Exclude primary key and foreign key for nested serialization
 
-class SystemInfoSerializer(serializers.ModelSerializer):
+class SystemInfoSerializer(CachedModelSerializer):
     class Meta:
         model = SystemInfo
-        exclude = ['id', 'asset_info']
-        # Add the new fields here
         fields = (
             'manufacturer', 'product_name', 'serial_number', 'bios_version',
-            'chassis_type', 'uptime_initial', 'last_update_check_time',
-            'pending_updates_count'
+            'chassis_type', 'uptime_initial'
         )
 
-class CPUInfoSerializer(serializers.ModelSerializer):
+class CPUInfoSerializer(CachedModelSerializer):
     class Meta:
         model = CPUInfo
         exclude = ['id', 'asset_info']
 
-class MemoryInfoSerializer(serializers.ModelSerializer):
+class MemoryInfoSerializer(CachedModelSerializer):
     class Meta:
         model = MemoryInfo
         exclude = ['id', 'asset_info']
 
-class DiskInfoSerializer(serializers.ModelSerializer):
+class DiskInfoSerializer(SizeBytesMixin, CachedModelSerializer):
+    size_fields = (('size', 'size_bytes'),)
+
     class Meta:
         model = DiskInfo
         exclude = ['id', 'asset_info'] # Exclude primary key and foreign key
+        read_only_fields = ['size_bytes']
         # 'fields' = '__all__' would also work if you want to include the FK for creation,
         # but we handle it via the parent serializer's create method.
 
-class NetworkInterfaceInfoSerializer(serializers.ModelSerializer):
+class NetworkInterfaceInfoSerializer(CachedModelSerializer):
     class Meta:
         model = NetworkInterfaceInfo
         exclude = ['id', 'asset_info']
 
-class VirtualizationInfoSerializer(serializers.ModelSerializer):
+class VirtualizationInfoSerializer(CachedModelSerializer):
     class Meta:
         model = VirtualizationInfo
         exclude = ['id', 'asset_info']
 
-class WindowsUpdateSerializer(serializers.ModelSerializer): # NEW Serializer for Windows Updates
+class WindowsUpdateSerializer(CachedModelSerializer): # NEW Serializer for Windows Updates
     class Meta:
         model = WindowsUpdate
-        exclude = ['id', 'asset_info'] # Exclude primary key and foreign key
+        exclude = ['id', 'asset_info', 'hostname'] # Exclude keys and the copied hostname
 
-class AssetInfoSerializer(serializers.ModelSerializer):
+class AssetInfoSerializer(CachedModelSerializer):
     """
     Serializer for AssetInfo, including nested serializers for its related one-to-one fields
     and many-to-one fields (disks, network_interfaces, windows_updates).
@@ -71,10 +248,15 @@ class AssetInfoSerializer(serializers.ModelSerializer):
     disks = DiskInfoSerializer(many=True, required=False) # 'many=True' for a list of objects
     network_interfaces = NetworkInterfaceInfoSerializer(many=True, required=False)
     windows_updates = WindowsUpdateSerializer(many=True, required=False) # NEW: Optional for Linux systems
+    # Not stored on AssetInfo; an incoming asset_info.hostname is ignored in favour of the metric's hostname
+    hostname = serializers.CharField(source='server_metric.hostname', read_only=True)
 
     class Meta:
         model = AssetInfo
-        exclude = ['id', 'server_metric'] # Exclude primary key and foreign key
+        exclude = ['id', 'server_metric', 'document', 'created_at'] # Exclude keys, the stored copy of this output and when it was stored
+        # Relations read when serializing, see CachedModelSerializer.setup_eager_loading
+        select_related = ('os', 'system', 'cpu', 'memory', 'virtualization') # One-to-one: JOINed into the main query
+        prefetch_related = ('disks', 'network_interfaces', 'windows_updates') # Reverse FKs: one extra query each
 
     def create(self, validated_data):
         # Handle nested creation for one-to-one relationships
@@ -86,8 +268,8 @@ class AssetInfoSerializer(serializers.ModelSerializer):
 
         # Handle nested creation for many-to-one relationships (lists)
         # Use .pop(key, []) to handle cases where the list might be empty or missing in the incoming JSON
-        disks_data = validated_data.pop('disks', [])
-        network_interfaces_data = validated_data.pop('network_interfaces', [])
+        disks_data = unique_by(validated_data.pop('disks', []), 'name')
+        network_interfaces_data = unique_by(validated_data.pop('network_interfaces', []), 'name')
         windows_updates_data = validated_data.pop('windows_updates', []) # NEW: Pop with default empty list
 
         asset_info = AssetInfo.objects.create(**validated_data)
@@ -98,43 +280,70 @@ class AssetInfoSerializer(serializers.ModelSerializer):
         MemoryInfo.objects.create(asset_info=asset_info, **memory_data)
         VirtualizationInfo.objects.create(asset_info=asset_info, **virtualization_data)
 
-        for disk_data in disks_data:
-            DiskInfo.objects.create(asset_info=asset_info, **disk_data)
-        for net_if_data in network_interfaces_data:
-            NetworkInterfaceInfo.objects.create(asset_info=asset_info, **net_if_data)
-        for update_data in windows_updates_data: # NEW: Create WindowsUpdate instances
-            WindowsUpdate.objects.create(asset_info=asset_info, **update_data)
+        # One INSERT per list instead of one per row
+        DiskInfo.objects.bulk_create(
+            [DiskInfo(asset_info=asset_info, **disk_data) for disk_data in disks_data],
+            batch_size=BULK_CREATE_BATCH_SIZE,
+        )
+        NetworkInterfaceInfo.objects.bulk_create(
+            [NetworkInterfaceInfo(asset_info=asset_info, **net_if_data) for net_if_data in network_interfaces_data],
+            batch_size=BULK_CREATE_BATCH_SIZE,
+        )
+        WindowsUpdate.objects.bulk_create(
+            [
+                WindowsUpdate(asset_info=asset_info, hostname=asset_info.server_metric.hostname, **update_data)
+                for update_data in windows_updates_data
+            ],
+            batch_size=BULK_CREATE_BATCH_SIZE,
+        )
+
+        # Now that the nested rows exist, store the document the asset list serves
+        AssetInfo.store_documents(AssetInfo.objects.filter(pk=asset_info.pk))
 
         return asset_info
 
 # --- Metric Data Serializers ---
 
-class DiskUsageMetricSerializer(serializers.ModelSerializer):
+class DiskUsageMetricSerializer(SizeBytesMixin, CachedModelSerializer):
+    size_fields = (
+        ('total_size', 'total_size_bytes'),
+        ('used_size', 'used_size_bytes'),
+        ('available_size', 'available_size_bytes'),
+    )
+
     class Meta:
         model = DiskUsageMetric
         exclude = ['id', 'metrics_data']
+        read_only_fields = ['total_size_bytes', 'used_size_bytes', 'available_size_bytes']
 
-class MemoryUsageMetricSerializer(serializers.ModelSerializer):
+class MemoryUsageMetricSerializer(CachedModelSerializer):
     class Meta:
         model = MemoryUsageMetric
         exclude = ['id', 'metrics_data']
 
-class CPULoadMetricSerializer(serializers.ModelSerializer):
+class CPULoadMetricSerializer(CachedModelSerializer):
     class Meta:
         model = CPULoadMetric
         exclude = ['id', 'metrics_data']
 
-class NetworkUsageMetricSerializer(serializers.ModelSerializer):
+class NetworkUsageMetricSerializer(CachedModelSerializer):
     class Meta:
         model = NetworkUsageMetric
         exclude = ['id', 'metrics_data']
 
-class ProcessDetailSerializer(serializers.ModelSerializer):
+# Columns read by ProcessDetailSerializer, plus the FK Django needs to attach prefetched rows
+PROCESS_DETAIL_FIELDS = (
+    'id', 'top_processes_metric_id', 'process_type', 'pid', 'user',
+    'cpu_percent', 'mem_percent', 'command',
+)
+
+class ProcessDetailSerializer(CachedModelSerializer):
     class Meta:
         model = ProcessDetail
         exclude = ['id', 'top_processes_metric']
+        read_only_fields = ['process_type'] # Set from the by_cpu/by_memory list the process came in
 
-class TopProcessesMetricSerializer(serializers.ModelSerializer):
+class TopProcessesMetricSerializer(CachedModelSerializer):
     """
     Serializer for TopProcessesMetric, handling the 'by_cpu' and 'by_memory' lists
     by creating ProcessDetail instances with a 'process_type' field.
@@ -142,10 +351,39 @@ class TopProcessesMetricSerializer(serializers.ModelSerializer):
     # These fields are not directly on the model but are used for incoming data
     by_cpu = ProcessDetailSerializer(many=True, required=False, write_only=True)
     by_memory = ProcessDetailSerializer(many=True, required=False, write_only=True)
+    # Read side of the lists above, served from the per-type prefetches when available
+    cpu_processes = serializers.SerializerMethodField()
+    memory_processes = serializers.SerializerMethodField()
 
     class Meta:
         model = TopProcessesMetric
         exclude = ['id', 'metrics_data']
+        # Processes are split by type in SQL so the serializer doesn't filter them in Python
+        prefetch_related = (
+            Prefetch(
+                'processes',
+                queryset=ProcessDetail.objects.filter(process_type='cpu').only(*PROCESS_DETAIL_FIELDS),
+                to_attr='by_cpu_prefetched',
+            ),
+            Prefetch(
+                'processes',
+                queryset=ProcessDetail.objects.filter(process_type='memory').only(*PROCESS_DETAIL_FIELDS),
+                to_attr='by_memory_prefetched',
+            ),
+        )
+
+    def get_cpu_processes(self, obj):
+        return self._get_processes(obj, 'cpu')
+
+    def get_memory_processes(self, obj):
+        return self._get_processes(obj, 'memory')
+
+    def _get_processes(self, obj, process_type):
+        processes = getattr(obj, f'by_{process_type}_prefetched', None)
+        if processes is None:
+            # Not loaded through setup_eager_loading
+            processes = obj.processes.filter(process_type=process_type)
+        return ProcessDetailSerializer(processes, many=True).data
 
     def create(self, validated_data):
         # Pop the lists of processes, as they are not direct model fields
@@ -154,29 +392,28 @@ class TopProcessesMetricSerializer(serializers.ModelSerializer):
 
         top_processes_metric = TopProcessesMetric.objects.create(**validated_data)
 
-        # Create ProcessDetail instances for CPU-bound processes
-        for process_data in by_cpu_data:
-            ProcessDetail.objects.create(
-                top_processes_metric=top_processes_metric,
-                process_type='cpu',
-                **process_data
-            )
-        # Create ProcessDetail instances for Memory-bound processes
-        for process_data in by_memory_data:
-            ProcessDetail.objects.create(
-                top_processes_metric=top_processes_metric,
-                process_type='memory',
-                **process_data
-            )
+        # Create CPU- and Memory-bound ProcessDetail instances in a single INSERT
+        processes = [
+            ProcessDetail(top_processes_metric=top_processes_metric, process_type='cpu', **process_data)
+            for process_data in by_cpu_data
+        ]
+        processes += [
+            ProcessDetail(top_processes_metric=top_processes_metric, process_type='memory', **process_data)
+            for process_data in by_memory_data
+        ]
+        ProcessDetail.objects.bulk_create(processes, batch_size=BULK_CREATE_BATCH_SIZE)
         return top_processes_metric
 
-class TopDiskConsumerMetricSerializer(serializers.ModelSerializer):
+class TopDiskConsumerMetricSerializer(SizeBytesMixin, CachedModelSerializer):
+    size_fields = (('size', 'size_bytes'),)
+
     class Meta:
         model = TopDiskConsumerMetric
         exclude = ['id', 'metrics_data']
+        read_only_fields = ['size_bytes']
 
 
-class MetricDataSerializer(serializers.ModelSerializer):
+class MetricDataSerializer(CachedModelSerializer):
     """
     Serializer for MetricData, including nested serializers for its related one-to-one fields
     and many-to-one fields (disk_usage, top_disk_consumers).
@@ -191,6 +428,8 @@ class MetricDataSerializer(serializers.ModelSerializer):
     class Meta:
         model = MetricData
         exclude = ['id', 'server_metric']
+        select_related = ('memory_usage', 'cpu_load', 'network_usage', 'top_processes')
+        prefetch_related = ('disk_usage', 'top_disk_consumers')
 
     def create(self, validated_data):
         # Handle nested creation for one-to-one relationships
@@ -200,25 +439,30 @@ class MetricDataSerializer(serializers.ModelSerializer):
         top_processes_data = validated_data.pop('top_processes')
 
         # Handle nested creation for many-to-one relationships (lists)
-        disk_usage_data = validated_data.pop('disk_usage', [])
-        top_disk_consumers_data = validated_data.pop('top_disk_consumers', [])
+        disk_usage_data = unique_by(validated_data.pop('disk_usage', []), 'filesystem')
+        top_disk_consumers_data = unique_by(validated_data.pop('top_disk_consumers', []), 'path')
 
         metrics_data = MetricData.objects.create(**validated_data)
 
         MemoryUsageMetric.objects.create(metrics_data=metrics_data, **memory_usage_data)
         CPULoadMetric.objects.create(metrics_data=metrics_data, **cpu_load_data)
         NetworkUsageMetric.objects.create(metrics_data=metrics_data, **network_usage_data)
-        TopProcessesMetric.objects.create(metrics_data=metrics_data, **top_processes_data)
+        # by_cpu/by_memory are not model fields, let the nested serializer unpack them
+        TopProcessesMetricSerializer().create({'metrics_data': metrics_data, **top_processes_data})
 
-        for du_data in disk_usage_data:
-            DiskUsageMetric.objects.create(metrics_data=metrics_data, **du_data)
-        for tdc_data in top_disk_consumers_data:
-            TopDiskConsumerMetric.objects.create(metrics_data=metrics_data, **tdc_data)
+        DiskUsageMetric.objects.bulk_create(
+            [DiskUsageMetric(metrics_data=metrics_data, **du_data) for du_data in disk_usage_data],
+            batch_size=BULK_CREATE_BATCH_SIZE,
+        )
+        TopDiskConsumerMetric.objects.bulk_create(
+            [TopDiskConsumerMetric(metrics_data=metrics_data, **tdc_data) for tdc_data in top_disk_consumers_data],
+            batch_size=BULK_CREATE_BATCH_SIZE,
+        )
 
         return metrics_data
 
 
-class ServerMetricSerializer(serializers.ModelSerializer):
+class ServerMetricSerializer(CachedModelSerializer):
     """
     Main serializer for ServerMetric, handling the entire nested structure.
     """
@@ -228,7 +472,12 @@ class ServerMetricSerializer(serializers.ModelSerializer):
     class Meta:
         model = ServerMetric
         fields = '__all__' # Include all fields from ServerMetric and its nested relations
+        select_related = ('asset_info', 'metrics_data')
+        # No UniqueTogetherValidator for (hostname, timestamp): a re-sent sample is still
+        # accepted and skipped at ingest by the database constraint
+        validators = []
 
+    @transaction.atomic # One commit for the whole nested tree; a failure leaves no orphaned rows
     def create(self, validated_data):
         # Pop nested data to handle separately
         asset_info_data = validated_data.pop('asset_info')
@@ -238,13 +487,13 @@ class ServerMetricSerializer(serializers.ModelSerializer):
         server_metric = ServerMetric.objects.create(**validated_data)
 
         # Create nested AssetInfo and MetricData instances
-        # Pass the created server_metric instance to the nested serializer's create method
-        asset_info_serializer = AssetInfoSerializer(data=asset_info_data)
-        asset_info_serializer.is_valid(raise_exception=True)
-        asset_info_serializer.create(asset_info_serializer.validated_data, server_metric=server_metric)
-
-        metrics_data_serializer = MetricDataSerializer(data=metrics_data)
-        metrics_data_serializer.is_valid(raise_exception=True)
-        metrics_data_serializer.create(metrics_data_serializer.validated_data, server_metric=server_metric)
+        # The nested data was already validated along with this serializer, so go straight to create
+        AssetInfoSerializer().create({'server_metric': server_metric, **asset_info_data})
+        MetricDataSerializer().create({'server_metric': server_metric, **metrics_data})
+
+        # Refresh the per-host view only once the new rows are visible to it; batch
+        # ingestion turns this off and refreshes once per batch instead
+        if self.context.get('refresh_latest', True):
+            transaction.on_commit(LatestServerMetric.refresh)
 
         return server_metric
@@ -0,0 +1,65 @@
+# monitoring/tasks.py
+
+import logging
+import time
+
+from django.db import DataError, IntegrityError, transaction
+
+from .models import LatestServerMetric, PendingServerMetric
+from .serializers import ServerMetricSerializer
+
+logger = logging.getLogger(__name__)
+
+# Queued payloads ingested per transaction
+INGEST_BATCH_SIZE = 500
+
+# ServerMetric's unique (hostname, timestamp) constraint, violated by re-sent metrics
+DUPLICATE_METRIC_CONSTRAINT = 'sm_hostname_timestamp_uniq'
+
+def _violated_constraint(exc):
+    """Name of the constraint behind an IntegrityError, as reported by Postgres."""
+    return getattr(getattr(exc.__cause__, 'diag', None), 'constraint_name', None)
+
+def ingest_pending_metrics(batch_size=INGEST_BATCH_SIZE):
+    """
+    Store up to batch_size queued ServerMetric payloads, oldest first, in one transaction
+    and return how many were taken off the queue. Rows are claimed with SKIP LOCKED, so
+    several workers can drain the queue side by side. Metrics already stored (same
+    hostname and timestamp, e.g. a POST retried by an agent) are skipped, and payloads
+    whose data the database rejects are logged and dropped instead of blocking the queue.
+    """
+    with transaction.atomic():
+        batch = list(
+            PendingServerMetric.objects.select_for_update(skip_locked=True).order_by('id')[:batch_size]
+        )
+        for pending in batch:
+            serializer = ServerMetricSerializer(data=pending.payload, context={'refresh_latest': False})
+            if serializer.is_valid():
+                # Runs in a savepoint, so a payload the database rejects only rolls back itself.
+                # Other errors (deadlocks, timeouts) roll back the batch, which is then retried.
+                try:
+                    serializer.save()
+                except IntegrityError as exc:
+                    if _violated_constraint(exc) == DUPLICATE_METRIC_CONSTRAINT:
+                        logger.info("Skipping pending metric %s: already stored", pending.pk)
+                    else:
+                        logger.error("Dropping pending metric %s: %s", pending.pk, exc)
+                except DataError as exc: # e.g. a value out of range for its column
+                    logger.error("Dropping pending metric %s: %s", pending.pk, exc)
+            else:
+                # Validated when received, so only possible if the schema changed since
+                logger.error("Dropping pending metric %s: %s", pending.pk, serializer.errors)
+        PendingServerMetric.objects.filter(pk__in=[pending.pk for pending in batch]).delete()
+        if batch:
+            transaction.on_commit(LatestServerMetric.refresh)
+    return len(batch)
+
+def run_ingest_worker(poll_interval=1.0):
+    """
+    Drain the queue forever, e.g. in a dedicated process next to the web workers
+    (`python manage.py shell -c "from monitoring.tasks import run_ingest_worker; run_ingest_worker()"`).
+    Sleeps poll_interval seconds whenever the queue is empty.
+    """
+    while True:
+        if not ingest_pending_metrics():
+            time.sleep(poll_interval)
@@ -1,11 +1,23 @@
 # monitoring/views.py
 
+from django.db.models import Max, Q
+from django.db.models.fields.json import KT
+from django.http import StreamingHttpResponse
+from django.utils.decorators import method_decorator
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition
 from rest_framework import viewsets, status
+from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination, PageNumberPagination
 from rest_framework.response import Response
 from rest_framework.permissions import AllowAny # Consider stricter permissions for production
+from rest_framework.renderers import BrowsableAPIRenderer
+from rest_framework.utils.urls import remove_query_param, replace_query_param
 
-from .models import ServerMetric, AssetInfo, WindowsUpdate
-from .serializers import ServerMetricSerializer, AssetInfoSerializer, WindowsUpdateSerializer
+from .models import ServerMetric, LatestServerMetric, PendingServerMetric, AssetInfo, WindowsUpdate
+from .renderers import ORJSONRenderer, encode_json
+from .serializers import BULK_CREATE_BATCH_SIZE, ServerMetricSerializer, AssetInfoSerializer, WindowsUpdateSerializer
 
 # Import your filters (assuming you followed the django-filter setup)
 from .filters import ServerMetricFilter, AssetInfoFilter, WindowsUpdateFilter
@@ -14,7 +26,86 @@ from .filters import ServerMetricFilter, AssetInfoFilter, WindowsUpdateFilter
 # from django_filters.rest_framework import DjangoFilterBackend
 
 
-class ServerMetricViewSet(viewsets.ModelViewSet):
+# Metrics fetched per query by the export endpoint
+EXPORT_CHUNK_SIZE = 2000
+
+# Rows fetched per query by streamed (unpaginated) list responses
+STREAM_CHUNK_SIZE = 1000
+
+
+class TimestampCursorPagination(CursorPagination):
+    """
+    Keyset pagination on the metric timestamp: each page is an index range scan
+    starting after the previous page's last row, however deep the client pages.
+    """
+    ordering = ('-timestamp', '-id')
+    page_size = 100
+
+
+class UncountedPageNumberPagination(PageNumberPagination):
+    """
+    Page-number pagination without the COUNT(*) query: each page fetches one extra row
+    to tell whether a next page exists. Responses have next/previous links but no
+    count, so clients page until `next` is null. Without a count there is no last page
+    either: ?page=last, which PageNumberPagination accepts, is a 404 here.
+    """
+    page_size = 100
+    # Deeper pages are a 404: an OFFSET scans every row it skips (and past bigint, fails)
+    max_page = 10000
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        page_number = request.query_params.get(self.page_query_param, '1')
+        try:
+            self.page_number = int(page_number)
+        except ValueError:
+            self.page_number = 0
+        if not 1 <= self.page_number <= self.max_page:
+            raise NotFound(self.invalid_page_message.format(page_number=page_number, message='Invalid page.'))
+        offset = (self.page_number - 1) * self.page_size
+        rows = list(queryset[offset:offset + self.page_size + 1])
+        self.has_next = len(rows) > self.page_size
+        return rows[:self.page_size]
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return replace_query_param(self.request.build_absolute_uri(), self.page_query_param, self.page_number + 1)
+
+    def get_previous_link(self):
+        if self.page_number == 1:
+            return None
+        url = self.request.build_absolute_uri()
+        if self.page_number == 2:
+            return remove_query_param(url, self.page_query_param)
+        return replace_query_param(url, self.page_query_param, self.page_number - 1)
+
+    def get_paginated_response(self, data):
+        return Response({'next': self.get_next_link(), 'previous': self.get_previous_link(), 'results': data})
+
+
+# Eager-loaded base querysets, keyed by (viewset class, serializer class). Never evaluated
+# themselves: every request gets a clone.
+_EAGER_QUERYSETS = {}
+
+class EagerLoadingMixin:
+    """
+    Eager-loads the relations declared on the serializer's Meta (and those of its
+    nested serializers) to avoid N+1 queries on reads. The lookups and column lists
+    only depend on the classes involved, so the resulting queryset is built once and
+    cloned per request.
+    """
+    def get_queryset(self):
+        key = (type(self), self.get_serializer_class())
+        if key not in _EAGER_QUERYSETS:
+            _EAGER_QUERYSETS[key] = key[1].setup_eager_loading(super().get_queryset())
+        queryset = _EAGER_QUERYSETS[key].all()
+        if self.action == 'retrieve':
+            queryset = queryset.order_by() # A primary key lookup: the list ordering is wasted work
+        return queryset
+
+
+class ServerMetricViewSet(EagerLoadingMixin, viewsets.ModelViewSet):
     """
     API endpoint that allows Server Metrics to be viewed or created.
     This is the primary endpoint for receiving data from your monitoring scripts.
@@ -22,37 +113,169 @@ class ServerMetricViewSet(viewsets.ModelViewSet):
     queryset = ServerMetric.objects.all().order_by('-timestamp') # Order by most recent first
     serializer_class = ServerMetricSerializer
     permission_classes = [AllowAny] # For simplicity during development. Adjust for production!
+    renderer_classes = [ORJSONRenderer, BrowsableAPIRenderer] # orjson when installed, see renderers.py
     filterset_class = ServerMetricFilter # Enable filtering for this ViewSet
+    pagination_class = TimestampCursorPagination
 
-    # You might want to override create to handle potential idempotency or custom logic
-    # def create(self, request, *args, **kwargs):
-    #     serializer = self.get_serializer(data=request.data)
-    #     serializer.is_valid(raise_exception=True)
-    #     self.perform_create(serializer)
-    #     headers = self.get_success_headers(serializer.data)
-    #     return Response(serializer.data, status=status.HTTP_201_CREATED, headers=headers)
+    def stream_list(self, queryset):
+        """
+        Serialize queryset as a JSON array streamed row by row, fetching (and prefetching)
+        STREAM_CHUNK_SIZE rows at a time so memory use doesn't grow with the result.
+        """
+        serializer = self.get_serializer()
 
+        def chunks():
+            separator = b'['
+            for instance in queryset.iterator(chunk_size=STREAM_CHUNK_SIZE):
+                yield separator + encode_json(serializer.to_representation(instance))
+                separator = b','
+            yield b'[]' if separator == b'[' else b']'
 
+        return StreamingHttpResponse(chunks(), content_type='application/json')
+
+    @action(detail=False, methods=['get'])
+    def latest(self, request):
+        """
+        Most recent metric for each host, e.g. /api/metrics/latest/.
+        Served from the latest_server_metric materialized view; one row per host,
+        so the response is streamed rather than paginated.
+        """
+        queryset = self.filter_queryset(self.get_queryset()).filter(
+            pk__in=LatestServerMetric.objects.values('server_metric')
+        )
+        return self.stream_list(queryset)
+
+    @action(detail=False, methods=['get'])
+    def fast(self, request):
+        """
+        Same documents as the list endpoint, built from .values() dicts instead of model
+        instances and serializers (e.g. /api/metrics/fast/). Works on any database.
+        """
+        queryset = self.filter_queryset(ServerMetric.objects.all())
+        page = self.paginate_queryset(queryset.values('id', 'timestamp'))
+        if page is not None:
+            page_queryset = queryset.filter(pk__in=[row['id'] for row in page])
+            documents = page_queryset.order_by(*self.paginator.ordering).nested_values()
+            return self.get_paginated_response(documents)
+        return Response(queryset.nested_values())
+
+    @action(detail=False, methods=['get'])
+    def summary(self, request):
+        """
+        One flat row of headline numbers per metric (e.g. /api/metrics/summary/), for
+        dashboards. Rows are .values() dicts from a single query, rendered as they are:
+        no model instances or serializers.
+        """
+        rows = self.filter_queryset(ServerMetric.objects.all()).summary_values()
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(page)
+        return Response(list(rows))
+
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        """
+        Stream every matching metric as JSON lines, oldest first (e.g. /api/metrics/export/).
+        Metrics are read in keyset-paginated chunks so memory use stays flat however
+        large the time range is.
+        """
+        queryset = self.filter_queryset(ServerMetric.objects.all()).order_by('timestamp', 'id')
+
+        def lines():
+            chunk = queryset[:EXPORT_CHUNK_SIZE].nested_values()
+            while chunk:
+                for document in chunk:
+                    yield encode_json(document) + b'\n'
+                # Continue after the last row: WHERE (timestamp, id) > (last_timestamp, last_id)
+                last_timestamp, last_id = chunk[-1]['timestamp'], chunk[-1]['id']
+                chunk = queryset.filter(
+                    Q(timestamp__gt=last_timestamp) | Q(timestamp=last_timestamp, id__gt=last_id)
+                )[:EXPORT_CHUNK_SIZE].nested_values()
+
+        return StreamingHttpResponse(lines(), content_type='application/x-ndjson')
+
+    @action(detail=False, methods=['get'])
+    def nested(self, request):
+        """
+        Same documents as the list endpoint, but assembled as JSON by Postgres in one
+        query instead of by the serializers (e.g. /api/metrics/nested/).
+        """
+        queryset = self.filter_queryset(ServerMetric.objects.with_nested_json())
+        rows = queryset.values('id', 'timestamp', 'nested_json') # The cursor is read from id/timestamp
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response([row['nested_json'] for row in page])
+        return Response([row['nested_json'] for row in rows])
+
+    def create(self, request, *args, **kwargs):
+        """
+        Validate the payload, one metric or a list of them (agents may batch samples), and
+        queue it instead of writing the nested rows in the request: one INSERT per POST,
+        answered with 202 Accepted. ingest_pending_metrics() (monitoring/tasks.py) stores
+        queued metrics in batches and skips any already stored, so retrying a POST is safe.
+        """
+        many = isinstance(request.data, list)
+        serializer = self.get_serializer(data=request.data, many=many)
+        serializer.is_valid(raise_exception=True) # Bad payloads are still rejected with a 400
+        payloads = request.data if many else [request.data]
+        PendingServerMetric.objects.bulk_create(
+            [PendingServerMetric(payload=payload) for payload in payloads], batch_size=BULK_CREATE_BATCH_SIZE
+        )
+        return Response(status=status.HTTP_202_ACCEPTED)
+
+
+def assets_last_modified(request, *args, **kwargs):
+    """
+    Last-Modified for the asset endpoints. Assets are never changed once stored, so the
+    newest created_at (read from its index) dates them. The metric timestamps can't be
+    used: they come from the agents' clocks and queued metrics are stored out of order.
+    """
+    return AssetInfo.objects.aggregate(last_modified=Max('created_at'))['last_modified']
+
+
+# Dashboards poll assets far more often than they change: answer unchanged polls with a 304
+asset_caching = [cache_control(max_age=30), condition(last_modified_func=assets_last_modified)]
+
+
+@method_decorator(asset_caching, name='list')
+@method_decorator(asset_caching, name='retrieve')
 class AssetInfoViewSet(viewsets.ReadOnlyModelViewSet):
     """
     API endpoint that allows Asset Information to be viewed.
     Data for AssetInfo is typically created via the ServerMetric endpoint.
+
+    Both list and detail serve the documents stored with each asset on ingest
+    (AssetInfo.document, assembled by Postgres with jsonb_agg) instead of loading and
+    serializing the nested rows, so nothing is joined or prefetched.
     """
-    queryset = AssetInfo.objects.all().prefetch_related(
-        'os', 'system', 'cpu', 'memory', 'virtualization',
-        'disks', 'network_interfaces', 'windows_updates' # Ensure all related fields are prefetched for efficiency
-    ).order_by('server_metric__hostname') # Order for consistent viewing
+    queryset = AssetInfo.objects.all().order_by(KT('document__hostname')) # Index-ordered
     serializer_class = AssetInfoSerializer
     permission_classes = [AllowAny]
+    renderer_classes = [ORJSONRenderer, BrowsableAPIRenderer] # orjson when installed, see renderers.py
     filterset_class = AssetInfoFilter # Enable filtering for this ViewSet
 
+    def list(self, request, *args, **kwargs):
+        documents = self.filter_queryset(self.get_queryset()).values_list('document', flat=True)
+        page = self.paginate_queryset(documents)
+        if page is not None:
+            return self.get_paginated_response(page)
+        return Response(list(documents))
+
+    def retrieve(self, request, *args, **kwargs):
+        document = self.get_object().document # Filters, 404s and object permissions as DRF does
+        if document is None: # Not built yet (stored before the column, awaiting backfill)
+            raise NotFound()
+        return Response(document)
+
 
-class WindowsUpdateViewSet(viewsets.ReadOnlyModelViewSet):
+class WindowsUpdateViewSet(EagerLoadingMixin, viewsets.ReadOnlyModelViewSet):
     """
     API endpoint that allows Windows Update History to be viewed.
     Data for Windows Updates is typically created via the ServerMetric endpoint.
     """
-    queryset = WindowsUpdate.objects.all().order_by('-installed_on', 'asset_info__server_metric__hostname')
+    queryset = WindowsUpdate.objects.all().order_by('-installed_on', 'hostname') # Served by the index on these columns
     serializer_class = WindowsUpdateSerializer
     permission_classes = [AllowAny]
+    renderer_classes = [ORJSONRenderer, BrowsableAPIRenderer] # orjson when installed, see renderers.py
     filterset_class = WindowsUpdateFilter # Enable filtering for this ViewSet
+    pagination_class = UncountedPageNumberPagination # installed_on is nullable, which rules out a cursor